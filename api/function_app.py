@@ -1,27 +1,42 @@
 import base64
+import gzip
 import io
 import json
 import os
+import threading
 import uuid
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta, timezone
+from functools import lru_cache
 
 import azure.functions as func
+import orjson
+import requests
 from azure.core.exceptions import ResourceExistsError, ResourceNotFoundError
+from azure.core.pipeline.transport import RequestsTransport
 from azure.storage.blob import BlobServiceClient, BlobSasPermissions, ContentSettings, generate_blob_sas
+from requests.adapters import HTTPAdapter
 
 app = func.FunctionApp(http_auth_level=func.AuthLevel.ANONYMOUS)
 
 METHODS = ['Cheung 2004', 'Finlayson 2015', 'Vandermonde', 'TPS-3D']
 
+_METHOD_POOL = ThreadPoolExecutor(max_workers=len(METHODS))
+
 UPLOAD_CONTAINER = os.environ.get('COLOR_CONTAINER_UPLOADS', 'uploads')
 OUTPUT_CONTAINER = os.environ.get('COLOR_CONTAINER_OUTPUTS', 'outputs')
 JOB_CONTAINER = os.environ.get('COLOR_CONTAINER_JOBS', 'jobs')
 QUEUE_NAME = os.environ.get('COLOR_QUEUE_NAME', 'colorjobs')
+BLOB_TRANSFER_CONCURRENCY = 8
+BLOB_POOL_SIZE = 32
+STATUS_HEARTBEAT_SECONDS = 10
+GZIP_MIN_BODY_BYTES = 64 * 1024
 STORAGE_CONNECTION_SETTING = os.environ.get('COLOR_STORAGE_CONNECTION_SETTING', 'AzureWebJobsStorage')
 
 RGB_SPACE = None
 REFERENCE_SWATCHES = None
-imageio = None
+REFERENCE_SWATCHES_LAB = None
+Image = None
 np = None
 colour = None
 RGB_COLOURSPACES = None
@@ -37,9 +52,22 @@ SETTINGS_SEGMENTATION_COLORCHECKER_CLASSIC = None
 extractor_segmentation = None
 segmenter_default = None
 
+_M_RGB_TO_XYZ = None
+_M_XYZ_TO_RGB = None
+_WHITEPOINT_XYZ = None
+_LAB_LO = None
+_LAB_HI = None
+_lab_shift_kernel = None
+_srgb_eotf_inplace = None
+_srgb_eotf_inverse_clip_inplace = None
+_u8_to_f32_norm = None
+_to_u8_clip = None
+
+_LAST_SUCCESSFUL_SEG_CFG = None
+
 
 def _lazy_imports():
-    global imageio
+    global Image
     global np
     global colour
     global RGB_COLOURSPACES
@@ -56,13 +84,19 @@ def _lazy_imports():
     global segmenter_default
     global RGB_SPACE
     global REFERENCE_SWATCHES
+    global REFERENCE_SWATCHES_LAB
+    global _M_RGB_TO_XYZ
+    global _M_XYZ_TO_RGB
+    global _WHITEPOINT_XYZ
+    global _LAB_LO
+    global _LAB_HI
 
     if RGB_SPACE is not None:
         return
 
     try:
-        import imageio.v2 as _imageio
         import numpy as _np
+        from PIL import Image as _Image
         import colour as _colour
         from colour import RGB_COLOURSPACES as _RGB_COLOURSPACES
         from colour.difference import delta_E_CIE2000 as _delta_E_CIE2000
@@ -106,7 +140,7 @@ def _lazy_imports():
     except Exception as exc:
         raise RuntimeError(f'Failed to import colour pipeline dependencies: {exc}') from exc
 
-    imageio = _imageio
+    Image = _Image
     np = _np
     colour = _colour
     RGB_COLOURSPACES = _RGB_COLOURSPACES
@@ -121,14 +155,171 @@ def _lazy_imports():
     SETTINGS_SEGMENTATION_COLORCHECKER_CLASSIC = _SETTINGS_SEGMENTATION_COLORCHECKER_CLASSIC
     extractor_segmentation = _extractor_segmentation
     segmenter_default = _segmenter_default
+    # float32 everywhere: halves the bytes moved on the memory-bound image
+    # pipelines and doubles SIMD throughput versus colour's float64 default.
+    colour.utilities.set_default_float_dtype(np.float32)
+    colour.utilities.set_default_int_dtype(np.int32)
     RGB_SPACE = RGB_COLOURSPACES['sRGB']
-    REFERENCE_SWATCHES = SETTINGS_DETECTION_COLORCHECKER_CLASSIC['reference_values']
+    REFERENCE_SWATCHES = np.asarray(
+        SETTINGS_DETECTION_COLORCHECKER_CLASSIC['reference_values'], dtype=np.float32
+    )
+    _M_RGB_TO_XYZ = np.ascontiguousarray(RGB_SPACE.matrix_RGB_to_XYZ, dtype=np.float32)
+    _M_XYZ_TO_RGB = np.ascontiguousarray(RGB_SPACE.matrix_XYZ_to_RGB, dtype=np.float32)
+    _WHITEPOINT_XYZ = np.asarray(colour.xy_to_XYZ(RGB_SPACE.whitepoint), dtype=np.float32)
+    _LAB_LO = np.array([0, -128, -128], dtype=np.float32)
+    _LAB_HI = np.array([100, 127, 127], dtype=np.float32)
+    REFERENCE_SWATCHES_LAB = _rgb_to_lab_small(REFERENCE_SWATCHES)
+    _compile_numba_kernels()
+
+
+def _compile_numba_kernels():
+    """Compile the fused pixel kernels once per process.
+
+    The kernels collapse the per-stage NumPy pipelines into single passes
+    over the image, keeping intermediates in registers instead of full-image
+    temporaries. When numba is unavailable the callers fall back to the
+    NumPy implementations.
+    """
+    global _lab_shift_kernel
+    global _srgb_eotf_inplace
+    global _srgb_eotf_inverse_clip_inplace
+    global _u8_to_f32_norm
+    global _to_u8_clip
+
+    try:
+        import numba
+    except Exception:
+        return
+
+    @numba.njit(parallel=True, fastmath=True, cache=True)
+    def to_u8_clip(f32, out):
+        height = f32.shape[0]
+        width = f32.shape[1]
+        for i in numba.prange(height):
+            for j in range(width):
+                for c in range(3):
+                    out[i, j, c] = min(255, max(0, int(f32[i, j, c] * 255.0 + 0.5)))
+
+    @numba.njit(parallel=True, fastmath=True, cache=True)
+    def u8_to_f32_norm(arr):
+        height = arr.shape[0]
+        width = arr.shape[1]
+        out = np.empty((height, width, 3), dtype=np.float32)
+        for i in numba.prange(height):
+            for j in range(width):
+                for c in range(3):
+                    out[i, j, c] = arr[i, j, c] * (1.0 / 255.0)
+        return out
+
+    @numba.njit(parallel=True, fastmath=True, cache=True)
+    def srgb_eotf_inplace(img):
+        height = img.shape[0]
+        width = img.shape[1]
+        for i in numba.prange(height):
+            for j in range(width):
+                for c in range(3):
+                    v = img[i, j, c]
+                    img[i, j, c] = v / 12.92 if v <= 0.04045 else ((v + 0.055) / 1.055) ** 2.4
+
+    @numba.njit(parallel=True, fastmath=True, cache=True)
+    def srgb_eotf_inverse_clip_inplace(img):
+        height = img.shape[0]
+        width = img.shape[1]
+        for i in numba.prange(height):
+            for j in range(width):
+                for c in range(3):
+                    v = min(1.0, max(0.0, img[i, j, c]))
+                    img[i, j, c] = 12.92 * v if v <= 0.0031308 else 1.055 * v ** (1.0 / 2.4) - 0.055
+
+    @numba.njit(parallel=True, fastmath=True, cache=True)
+    def lab_shift_kernel(rgb, shift_l, shift_a, shift_b, wp_x, wp_y, wp_z, m_fwd, m_inv):
+        height = rgb.shape[0]
+        width = rgb.shape[1]
+        for i in numba.prange(height):
+            for j in range(width):
+                # sRGB EOTF (decode to linear light).
+                r = rgb[i, j, 0]
+                g = rgb[i, j, 1]
+                b = rgb[i, j, 2]
+                r = r / 12.92 if r <= 0.04045 else ((r + 0.055) / 1.055) ** 2.4
+                g = g / 12.92 if g <= 0.04045 else ((g + 0.055) / 1.055) ** 2.4
+                b = b / 12.92 if b <= 0.04045 else ((b + 0.055) / 1.055) ** 2.4
+
+                x = (m_fwd[0, 0] * r + m_fwd[0, 1] * g + m_fwd[0, 2] * b) / wp_x
+                y = (m_fwd[1, 0] * r + m_fwd[1, 1] * g + m_fwd[1, 2] * b) / wp_y
+                z = (m_fwd[2, 0] * r + m_fwd[2, 1] * g + m_fwd[2, 2] * b) / wp_z
+
+                fx = x ** (1.0 / 3.0) if x > 0.008856 else 7.787 * x + 16.0 / 116.0
+                fy = y ** (1.0 / 3.0) if y > 0.008856 else 7.787 * y + 16.0 / 116.0
+                fz = z ** (1.0 / 3.0) if z > 0.008856 else 7.787 * z + 16.0 / 116.0
+
+                lab_l = min(100.0, max(0.0, 116.0 * fy - 16.0 + shift_l))
+                lab_a = min(127.0, max(-128.0, 500.0 * (fx - fy) + shift_a))
+                lab_b = min(127.0, max(-128.0, 200.0 * (fy - fz) + shift_b))
+
+                fy = (lab_l + 16.0) / 116.0
+                fx = fy + lab_a / 500.0
+                fz = fy - lab_b / 200.0
+
+                fx3 = fx * fx * fx
+                fy3 = fy * fy * fy
+                fz3 = fz * fz * fz
+                x = (fx3 if fx3 > 0.008856 else (fx - 16.0 / 116.0) / 7.787) * wp_x
+                y = (fy3 if fy3 > 0.008856 else (fy - 16.0 / 116.0) / 7.787) * wp_y
+                z = (fz3 if fz3 > 0.008856 else (fz - 16.0 / 116.0) / 7.787) * wp_z
+
+                r = min(1.0, max(0.0, m_inv[0, 0] * x + m_inv[0, 1] * y + m_inv[0, 2] * z))
+                g = min(1.0, max(0.0, m_inv[1, 0] * x + m_inv[1, 1] * y + m_inv[1, 2] * z))
+                b = min(1.0, max(0.0, m_inv[2, 0] * x + m_inv[2, 1] * y + m_inv[2, 2] * z))
+
+                # Inverse sRGB EOTF (encode back to display values).
+                r = 12.92 * r if r <= 0.0031308 else 1.055 * r ** (1.0 / 2.4) - 0.055
+                g = 12.92 * g if g <= 0.0031308 else 1.055 * g ** (1.0 / 2.4) - 0.055
+                b = 12.92 * b if b <= 0.0031308 else 1.055 * b ** (1.0 / 2.4) - 0.055
+
+                rgb[i, j, 0] = min(1.0, max(0.0, r))
+                rgb[i, j, 1] = min(1.0, max(0.0, g))
+                rgb[i, j, 2] = min(1.0, max(0.0, b))
+
+    _lab_shift_kernel = lab_shift_kernel
+    _srgb_eotf_inplace = srgb_eotf_inplace
+    _srgb_eotf_inverse_clip_inplace = srgb_eotf_inverse_clip_inplace
+    _u8_to_f32_norm = u8_to_f32_norm
+    _to_u8_clip = to_u8_clip
 
 
 def _now_iso():
     return datetime.now(timezone.utc).isoformat()
 
 
+def _json_response(obj, req=None, status_code=200):
+    # orjson serialises NumPy arrays directly, skipping the per-element
+    # boxing that ndarray.tolist() + json.dumps would do.
+    body = orjson.dumps(obj, option=orjson.OPT_SERIALIZE_NUMPY)
+    headers = {'Content-Length': str(len(body))}
+    accepts_gzip = req is not None and 'gzip' in req.headers.get('Accept-Encoding', '')
+    if accepts_gzip and len(body) > GZIP_MIN_BODY_BYTES:
+        # Level 1 is enough: base64 payloads compress ~25% almost for free.
+        body = gzip.compress(body, compresslevel=1)
+        headers = {
+            'Content-Encoding': 'gzip',
+            'Content-Length': str(len(body)),
+        }
+    return func.HttpResponse(
+        body,
+        status_code=status_code,
+        mimetype='application/json',
+        headers=headers
+    )
+
+
+_BLOB_SERVICE = None
+_CONN_PARTS = None
+_CONTAINER_CLIENTS = {}
+_ENSURED_CONTAINERS = set()
+_ACCOUNT_INFO = None
+
+
 def _get_storage_connection_string():
     connection = os.environ.get(STORAGE_CONNECTION_SETTING)
     if not connection:
@@ -139,24 +330,46 @@ def _get_storage_connection_string():
 
 
 def _get_blob_service():
-    return BlobServiceClient.from_connection_string(_get_storage_connection_string())
+    global _BLOB_SERVICE
+    if _BLOB_SERVICE is None:
+        # The pool must be at least BLOB_TRANSFER_CONCURRENCY wide, otherwise
+        # parallel block transfers serialise on "connection pool is full".
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=BLOB_POOL_SIZE, pool_maxsize=BLOB_POOL_SIZE)
+        session.mount('https://', adapter)
+        _BLOB_SERVICE = BlobServiceClient.from_connection_string(
+            _get_storage_connection_string(),
+            transport=RequestsTransport(session=session),
+            connection_timeout=20,
+            read_timeout=60,
+        )
+    return _BLOB_SERVICE
 
 
 def _parse_connection_string(connection):
+    global _CONN_PARTS
+    if _CONN_PARTS is not None and _CONN_PARTS[0] == connection:
+        return _CONN_PARTS[1]
     parts = {}
     for item in connection.split(';'):
         if '=' in item:
             key, value = item.split('=', 1)
             parts[key] = value
+    _CONN_PARTS = (connection, parts)
     return parts
 
 
 def _ensure_container(container_name):
-    client = _get_blob_service().get_container_client(container_name)
-    try:
-        client.create_container()
-    except ResourceExistsError:
-        pass
+    client = _CONTAINER_CLIENTS.get(container_name)
+    if client is None:
+        client = _get_blob_service().get_container_client(container_name)
+        _CONTAINER_CLIENTS[container_name] = client
+    if container_name not in _ENSURED_CONTAINERS:
+        try:
+            client.create_container()
+        except ResourceExistsError:
+            pass
+        _ENSURED_CONTAINERS.add(container_name)
     return client
 
 
@@ -184,52 +397,80 @@ def _read_job_status(job_id):
     return json.loads(data)
 
 
+def _account_info():
+    global _ACCOUNT_INFO
+    if _ACCOUNT_INFO is None:
+        parts = _parse_connection_string(_get_storage_connection_string())
+        account_name = parts.get('AccountName')
+        account_key = parts.get('AccountKey')
+        if not account_name or not account_key:
+            raise ValueError('AccountName or AccountKey missing in storage connection string.')
+        _ACCOUNT_INFO = (account_name, account_key, parts.get('EndpointSuffix', 'core.windows.net'))
+    return _ACCOUNT_INFO
+
+
 def _generate_blob_sas_url(container, blob_name, permissions, expires_in_hours=1):
-    connection = _get_storage_connection_string()
-    parts = _parse_connection_string(connection)
-    account_name = parts.get('AccountName')
-    account_key = parts.get('AccountKey')
-    if not account_name or not account_key:
-        raise ValueError('AccountName or AccountKey missing in storage connection string.')
+    account_name, account_key, endpoint_suffix = _account_info()
     sas = generate_blob_sas(
         account_name=account_name,
         container_name=container,
         blob_name=blob_name,
         account_key=account_key,
         permission=permissions,
-        expiry=datetime.utcnow() + timedelta(hours=expires_in_hours)
+        expiry=datetime.now(timezone.utc) + timedelta(hours=expires_in_hours)
     )
-    return f'https://{account_name}.blob.core.windows.net/{container}/{blob_name}?{sas}'
+    return f'https://{account_name}.blob.{endpoint_suffix}/{container}/{blob_name}?{sas}'
 
 
 def _decode_image_bytes(raw):
     _lazy_imports()
-    image = imageio.imread(io.BytesIO(raw))
+    # Pillow decodes through libjpeg-turbo directly; imageio's plugin
+    # dispatch would route here anyway with extra overhead.
+    with Image.open(io.BytesIO(raw)) as decoded:
+        if decoded.mode not in ('RGB', 'L'):
+            decoded = decoded.convert('RGB')
+        image = np.asarray(decoded)
     if image.ndim == 2:
-        image = np.stack([image] * 3, axis=-1)
-    if image.shape[-1] == 4:
-        image = image[:, :, :3]
+        # Zero-copy view: the three channels alias the same 2D buffer, and
+        # the normalisation below materialises a real float32 array anyway.
+        image = np.broadcast_to(image[..., None], image.shape + (3,))
+    if _u8_to_f32_norm is not None:
+        return _u8_to_f32_norm(image)
     return image.astype(np.float32) / 255.0
 
 
 def _decode_base64_image(data):
     if not data:
         raise ValueError('Missing image data.')
-    if ',' in data:
-        data = data.split(',', 1)[1]
+    if isinstance(data, (bytes, bytearray, memoryview)):
+        # Raw image bytes (e.g. multipart uploads) skip the base64 trip.
+        return _decode_image_bytes(data)
+    comma = data.find(',')
+    if comma >= 0:
+        data = data[comma + 1:]
     raw = base64.b64decode(data)
     return _decode_image_bytes(raw)
 
 
 def _encode_image_bytes(image, fmt, quality):
     _lazy_imports()
-    image = np.clip(image, 0.0, 1.0)
-    image_uint8 = (image * 255.0 + 0.5).astype(np.uint8)
+    if _to_u8_clip is not None:
+        image_uint8 = np.empty(image.shape, dtype=np.uint8)
+        _to_u8_clip(image, image_uint8)
+    else:
+        image_uint8 = (np.clip(image, 0.0, 1.0) * 255.0 + 0.5).astype(np.uint8)
     buffer = io.BytesIO()
+    encoder = Image.fromarray(image_uint8, 'RGB')
     if fmt == 'image/png':
-        imageio.imwrite(buffer, image_uint8, format='png')
+        encoder.save(buffer, format='PNG', compress_level=1)
     else:
-        imageio.imwrite(buffer, image_uint8, format='jpeg', quality=int(quality * 100))
+        encoder.save(
+            buffer,
+            format='JPEG',
+            quality=int(quality * 100),
+            subsampling=2,
+            optimize=False,
+        )
     return buffer.getvalue()
 
 
@@ -237,56 +478,82 @@ def _encode_image(image, fmt, quality):
     return base64.b64encode(_encode_image_bytes(image, fmt, quality)).decode('ascii')
 
 
-def _compute_delta_e(measured_swatches, reference_swatches):
+def _rgb_to_lab_small(rgb):
+    """Convert a small linear-RGB array (e.g. 24x3 swatches) to CIE Lab.
+
+    Inlines the sRGB matrix and the Lab transfer function; for arrays this
+    size colour's generic dispatch and validation cost more than the maths.
+    """
+    xyz = rgb @ _M_RGB_TO_XYZ.T
+    xyz = xyz / _WHITEPOINT_XYZ
+    f = np.where(xyz > 0.008856, np.cbrt(xyz), 7.787 * xyz + 16.0 / 116.0)
+    lab_l = 116.0 * f[..., 1] - 16.0
+    lab_a = 500.0 * (f[..., 0] - f[..., 1])
+    lab_b = 200.0 * (f[..., 1] - f[..., 2])
+    return np.stack([lab_l, lab_a, lab_b], axis=-1)
+
+
+def _compute_delta_e(measured_swatches, reference_swatches=None):
     _lazy_imports()
-    measured_xyz = RGB_to_XYZ(measured_swatches, RGB_SPACE)
-    reference_xyz = RGB_to_XYZ(reference_swatches, RGB_SPACE)
-    measured_lab = XYZ_to_Lab(measured_xyz, RGB_SPACE.whitepoint)
-    reference_lab = XYZ_to_Lab(reference_xyz, RGB_SPACE.whitepoint)
+    measured_lab = _rgb_to_lab_small(measured_swatches)
+    if reference_swatches is None:
+        reference_lab = REFERENCE_SWATCHES_LAB
+    else:
+        reference_lab = _rgb_to_lab_small(reference_swatches)
     delta_e = delta_E_CIE2000(measured_lab, reference_lab)
     return delta_e
 
 
 def _extract_swatches(image):
     _lazy_imports()
+    global _LAST_SUCCESSFUL_SEG_CFG
     settings = SETTINGS_SEGMENTATION_COLORCHECKER_CLASSIC.copy()
-    attempts = []
 
-    for working_width in (settings['working_width'], 2200):
-        working_height = int(working_width * 4 / 6)
+    # Upscaled attempts only help when the input actually has more pixels
+    # than the default working width; otherwise they redo the same work.
+    widths = [settings['working_width']]
+    if max(image.shape[0], image.shape[1]) > 2200:
+        widths.append(2200)
+    loose_width = widths[-1]
+
+    configs = []
+    for working_width in widths:
+        configs.append((False, working_width, False))
+        configs.append((True, working_width, False))
+    configs.append((False, loose_width, True))
+    configs.append((True, loose_width, True))
+
+    # Clients tend to send similar imagery, so probe whatever worked for
+    # the previous call first.
+    if _LAST_SUCCESSFUL_SEG_CFG in configs:
+        configs.remove(_LAST_SUCCESSFUL_SEG_CFG)
+        configs.insert(0, _LAST_SUCCESSFUL_SEG_CFG)
+
+    for config in configs:
+        apply_cctf_encoding, working_width, loose = config
         tuned = {
             **settings,
             'working_width': working_width,
-            'working_height': working_height,
+            'working_height': int(working_width * 4 / 6),
         }
-        attempts.append((False, True, tuned))
-        attempts.append((True, True, tuned))
-
-    tuned_loose = {
-        **settings,
-        'working_width': 2200,
-        'working_height': int(2200 * 4 / 6),
-        'swatch_minimum_area_factor': settings['swatch_minimum_area_factor'] * 3
-    }
-    attempts.append((False, True, tuned_loose))
-    attempts.append((True, True, tuned_loose))
-
-    for apply_cctf_encoding, apply_cctf_decoding, seg_settings in attempts:
+        if loose:
+            tuned['swatch_minimum_area_factor'] = settings['swatch_minimum_area_factor'] * 3
         try:
             segmentation_data = segmenter_default(
                 image,
                 additional_data=True,
                 apply_cctf_encoding=apply_cctf_encoding,
-                **seg_settings
+                **tuned
             )
             swatches_sets = extractor_segmentation(
                 image,
                 segmentation_data,
-                apply_cctf_decoding=apply_cctf_decoding,
+                apply_cctf_decoding=True,
                 additional_data=False,
-                **seg_settings
+                **tuned
             )
             if swatches_sets:
+                _LAST_SUCCESSFUL_SEG_CFG = config
                 return swatches_sets[0]
         except Exception:
             continue
@@ -297,42 +564,97 @@ def _extract_swatches(image):
     )
 
 
+@lru_cache(maxsize=8)
+def _cheung_matrix_cached(swatches_bytes, shape):
+    """Fit the Cheung 2004 colour-correction matrix once per calibration.
+
+    The matrix depends only on the measured/reference swatch pair, not on
+    the image, so repeated correct calls with the same calibration reuse it.
+    """
+    fit = getattr(colour.characterisation, 'matrix_colour_correction_Cheung2004', None)
+    if fit is None:
+        return None
+    measured = np.frombuffer(swatches_bytes, dtype=np.float32).reshape(shape)
+    ccm = fit(measured, REFERENCE_SWATCHES)
+    return np.ascontiguousarray(ccm.T, dtype=np.float32)
+
+
 def _apply_colour_correction(image, swatches, method):
     _lazy_imports()
-    image_linear = eotf_sRGB(image)
+    if _srgb_eotf_inplace is not None:
+        image_linear = np.array(image, dtype=np.float32)
+        _srgb_eotf_inplace(image_linear)
+    else:
+        image_linear = np.ascontiguousarray(eotf_sRGB(image), dtype=np.float32)
+    # reshape on a C-contiguous buffer is a view; on anything else it would
+    # silently copy 4*H*W*3 bytes before colour's matmul even starts.
     flat = image_linear.reshape(-1, 3)
-    corrected = colour.colour_correction(
-        flat,
-        swatches,
-        REFERENCE_SWATCHES,
-        method=method
-    )
-    corrected = corrected.reshape(image_linear.shape)
-    corrected = eotf_inverse_sRGB(np.clip(corrected, 0.0, 1.0))
+    ccm_t = None
+    if method == 'Cheung 2004':
+        measured = np.ascontiguousarray(swatches, dtype=np.float32)
+        ccm_t = _cheung_matrix_cached(measured.tobytes(), measured.shape)
+    if ccm_t is not None:
+        # The default 3-term Cheung expansion is the identity, so applying
+        # the cached matrix is a single float32 GEMM over the flat image.
+        corrected = flat @ ccm_t
+    else:
+        corrected = colour.colour_correction(
+            flat,
+            swatches,
+            REFERENCE_SWATCHES,
+            method=method
+        )
+    corrected = np.ascontiguousarray(corrected, dtype=np.float32).reshape(image_linear.shape)
+    if _srgb_eotf_inverse_clip_inplace is not None:
+        _srgb_eotf_inverse_clip_inplace(corrected)
+    else:
+        corrected = eotf_inverse_sRGB(np.clip(corrected, 0.0, 1.0))
     return corrected
 
 
+def _score_method(method, swatches):
+    try:
+        corrected = colour.colour_correction(
+            swatches,
+            swatches,
+            REFERENCE_SWATCHES,
+            method=method
+        )
+        delta_e = _compute_delta_e(corrected)
+        return float(np.mean(delta_e))
+    except Exception:
+        return None
+
+
 def _evaluate_methods(swatches):
     _lazy_imports()
-    scores = {}
-    for method in METHODS:
-        try:
-            corrected = colour.colour_correction(
-                swatches,
-                swatches,
-                REFERENCE_SWATCHES,
-                method=method
-            )
-            delta_e = _compute_delta_e(corrected, REFERENCE_SWATCHES)
-            scores[method] = float(np.mean(delta_e))
-        except Exception:
-            scores[method] = None
+    # The four fits are independent and dominated by LAPACK calls that
+    # release the GIL, so they parallelise well across threads.
+    futures = {
+        method: _METHOD_POOL.submit(_score_method, method, swatches)
+        for method in METHODS
+    }
+    scores = {method: future.result() for method, future in futures.items()}
 
     valid = {k: v for k, v in scores.items() if v is not None}
     recommended = min(valid, key=valid.get) if valid else METHODS[0]
     return scores, recommended
 
 
+@lru_cache(maxsize=32)
+def _evaluate_methods_cached(swatches_bytes, shape):
+    swatches = np.frombuffer(swatches_bytes, dtype=np.float32).reshape(shape)
+    return _evaluate_methods(swatches)
+
+
+def _evaluate_methods_for(swatches):
+    """Memoised _evaluate_methods, so analyze followed by correct with the
+    same calibration swatches pays the 4-method fit only once."""
+    _lazy_imports()
+    swatches = np.ascontiguousarray(swatches, dtype=np.float32)
+    return _evaluate_methods_cached(swatches.tobytes(), swatches.shape)
+
+
 def _apply_lab_shift(image, shift):
     _lazy_imports()
     if not shift:
@@ -343,12 +665,27 @@ def _apply_lab_shift(image, shift):
     if shift_l == 0 and shift_a == 0 and shift_b == 0:
         return image
 
+    if _lab_shift_kernel is not None:
+        rgb = np.array(image, dtype=np.float32)
+        _lab_shift_kernel(
+            rgb,
+            shift_l,
+            shift_a,
+            shift_b,
+            float(_WHITEPOINT_XYZ[0]),
+            float(_WHITEPOINT_XYZ[1]),
+            float(_WHITEPOINT_XYZ[2]),
+            _M_RGB_TO_XYZ,
+            _M_XYZ_TO_RGB,
+        )
+        return rgb
+
     rgb_linear = eotf_sRGB(image)
     xyz = RGB_to_XYZ(rgb_linear, RGB_SPACE)
     lab = XYZ_to_Lab(xyz, RGB_SPACE.whitepoint)
-    lab[..., 0] = np.clip(lab[..., 0] + shift_l, 0, 100)
-    lab[..., 1] = np.clip(lab[..., 1] + shift_a, -128, 127)
-    lab[..., 2] = np.clip(lab[..., 2] + shift_b, -128, 127)
+    shift_vec = np.array([shift_l, shift_a, shift_b], dtype=np.float32)
+    np.add(lab, shift_vec, out=lab)
+    np.clip(lab, _LAB_LO, _LAB_HI, out=lab)
     xyz2 = Lab_to_XYZ(lab, RGB_SPACE.whitepoint)
     rgb_linear2 = XYZ_to_RGB(xyz2, RGB_SPACE)
     rgb_linear2 = np.clip(rgb_linear2, 0.0, 1.0)
@@ -373,10 +710,12 @@ def colorchecker_analyze(req: func.HttpRequest) -> func.HttpResponse:
         payload = req.get_json()
         image = _decode_base64_image(payload.get('image'))
         swatches = _extract_swatches(image)
-        delta_e = _compute_delta_e(swatches, REFERENCE_SWATCHES)
-        method_scores, recommended_method = _evaluate_methods(swatches)
-        swatches_xyz = RGB_to_XYZ(swatches, RGB_SPACE)
-        swatches_lab = XYZ_to_Lab(swatches_xyz, RGB_SPACE.whitepoint)
+        delta_e = _compute_delta_e(swatches)
+        if bool(payload.get('evaluateMethods', True)):
+            method_scores, recommended_method = _evaluate_methods_for(swatches)
+        else:
+            method_scores, recommended_method = None, None
+        swatches_lab = _rgb_to_lab_small(swatches)
         neutral = swatches_lab[18:24]
         neutral_mean = np.mean(neutral[:, 1:3], axis=0)
         neutral_std = np.std(neutral[:, 1:3], axis=0)
@@ -394,10 +733,10 @@ def colorchecker_analyze(req: func.HttpRequest) -> func.HttpResponse:
           score -= (l_min - 8) * 0.5
         score = float(np.clip(score, 0, 100))
         response = {
-            'deltaE': delta_e.tolist(),
+            'deltaE': delta_e,
             'deltaEAvg': float(np.mean(delta_e)),
             'deltaEMax': float(np.max(delta_e)),
-            'swatches': swatches.tolist(),
+            'swatches': swatches,
             'methodScores': method_scores,
             'recommendedMethod': recommended_method,
             'neutralStats': {
@@ -410,7 +749,7 @@ def colorchecker_analyze(req: func.HttpRequest) -> func.HttpResponse:
             },
             'qualityScore': score
         }
-        return func.HttpResponse(json.dumps(response), mimetype='application/json')
+        return _json_response(response, req)
     except Exception as exc:
         return func.HttpResponse(str(exc), status_code=400)
 
@@ -431,15 +770,27 @@ def colorchecker_correct(req: func.HttpRequest) -> func.HttpResponse:
             raise ValueError('Calibration swatches are missing.')
 
         if method == 'auto':
-            _, method = _evaluate_methods(swatches)
+            _, method = _evaluate_methods_for(swatches)
         corrected = _apply_colour_correction(image, swatches, method)
         corrected = _apply_lab_shift(corrected, spot_shift)
+        if payload.get('binary'):
+            # Raw image bytes instead of base64-in-JSON: ~25% fewer bytes
+            # over the wire and no base64 encode/decode on either side.
+            body = _encode_image_bytes(corrected, fmt, quality)
+            return func.HttpResponse(
+                body,
+                mimetype=fmt,
+                headers={
+                    'Content-Length': str(len(body)),
+                    'X-Method-Used': method,
+                }
+            )
         encoded = _encode_image(corrected, fmt, quality)
         response = {
             'image': encoded,
             'methodUsed': method
         }
-        return func.HttpResponse(json.dumps(response), mimetype='application/json')
+        return _json_response(response, req)
     except Exception as exc:
         return func.HttpResponse(str(exc), status_code=400)
 
@@ -467,7 +818,7 @@ def jobs_sas(req: func.HttpRequest) -> func.HttpResponse:
             'blobName': blob_name,
             'expiresAt': (datetime.utcnow() + timedelta(hours=2)).isoformat() + 'Z'
         }
-        return func.HttpResponse(json.dumps(response), mimetype='application/json')
+        return _json_response(response, req)
     except Exception as exc:
         return func.HttpResponse(str(exc), status_code=400)
 
@@ -522,7 +873,7 @@ def jobs_submit(req: func.HttpRequest, msg: func.Out[str]) -> func.HttpResponse:
             'jobId': job_id,
             'status': 'queued'
         }
-        return func.HttpResponse(json.dumps(response), mimetype='application/json')
+        return _json_response(response, req)
     except Exception as exc:
         return func.HttpResponse(str(exc), status_code=400)
 
@@ -535,7 +886,7 @@ def jobs_status(req: func.HttpRequest) -> func.HttpResponse:
     job = _read_job_status(job_id)
     if not job:
         return func.HttpResponse('Job not found.', status_code=404)
-    return func.HttpResponse(json.dumps(job), mimetype='application/json')
+    return _json_response(job, req)
 
 
 @app.route(route='jobs/result/{jobId}', methods=['GET'], auth_level=func.AuthLevel.ANONYMOUS)
@@ -566,7 +917,7 @@ def jobs_result(req: func.HttpRequest) -> func.HttpResponse:
         'downloadUrl': download_url,
         'outputBlob': output_blob
     }
-    return func.HttpResponse(json.dumps(response), mimetype='application/json')
+    return _json_response(response, req)
 
 
 @app.queue_trigger(arg_name='msg', queue_name=QUEUE_NAME, connection=STORAGE_CONNECTION_SETTING)
@@ -594,20 +945,33 @@ def jobs_processor(msg: func.QueueMessage) -> None:
         pass
 
     job_status = _read_job_status(job_id) or {}
-    job_status.update({
-        'jobId': job_id,
-        'status': 'processing',
-        'updatedAt': _now_iso()
-    })
-    _write_job_status(job_id, job_status)
+    job_status['jobId'] = job_id
+
+    # Callers already see the job as queued; the intermediate 'processing'
+    # write is only worth a round-trip for jobs that run long enough for
+    # someone to poll in between, so it is deferred behind a timer and
+    # skipped entirely on fast jobs.
+    finished = threading.Event()
+
+    def _write_processing():
+        if finished.is_set():
+            return
+        snapshot = dict(job_status)
+        snapshot['status'] = 'processing'
+        snapshot['updatedAt'] = _now_iso()
+        _write_job_status(job_id, snapshot)
+
+    heartbeat = threading.Timer(STATUS_HEARTBEAT_SECONDS, _write_processing)
+    heartbeat.daemon = True
+    heartbeat.start()
 
     try:
         input_client = blob_service.get_blob_client(container=UPLOAD_CONTAINER, blob=input_blob)
-        raw = input_client.download_blob().readall()
+        raw = input_client.download_blob(max_concurrency=BLOB_TRANSFER_CONCURRENCY).readall()
         image = _decode_image_bytes(raw)
 
         if method == 'auto':
-            _, method = _evaluate_methods(swatches)
+            _, method = _evaluate_methods_for(swatches)
         corrected = _apply_colour_correction(image, swatches, method)
         corrected = _apply_lab_shift(corrected, spot_shift)
         encoded = _encode_image_bytes(corrected, fmt, quality)
@@ -616,9 +980,15 @@ def jobs_processor(msg: func.QueueMessage) -> None:
         output_client.upload_blob(
             encoded,
             overwrite=True,
+            max_concurrency=BLOB_TRANSFER_CONCURRENCY,
             content_settings=ContentSettings(content_type=fmt)
         )
 
+        finished.set()
+        heartbeat.cancel()
+        # join() waits out an in-flight callback so a late 'processing'
+        # write can never land after the terminal status.
+        heartbeat.join()
         job_status.update({
             'status': 'done',
             'outputBlob': output_blob,
@@ -627,6 +997,9 @@ def jobs_processor(msg: func.QueueMessage) -> None:
         })
         _write_job_status(job_id, job_status)
     except Exception as exc:
+        finished.set()
+        heartbeat.cancel()
+        heartbeat.join()
         job_status.update({
             'status': 'error',
             'error': str(exc),